@@ -1,81 +1,213 @@
 import numpy as np
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
 import torch.optim as optim
-from sklearn.metrics import accuracy_score
 import os
 import matplotlib.pyplot as plt
 import random
 
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+# pairs sampled per generator seed by _sample_pairs
+SAMPLE_CHUNK_SIZE = 4096
+
+# derived arrays cached on the dataset dict, see get_cumsums and precompute_obs_act
+CACHED_KEYS = ('_term_cum', '_rew_cum', '_obs_act')
+
+def clear_cache(dataset):
+    for k in CACHED_KEYS:
+        dataset.pop(k, None)
+    return dataset
+
 def scale_rewards(dataset):
-    min_reward = min(dataset['rewards'])
-    max_value = max(dataset['rewards'])
-    dataset['rewards'] = [-1 + 2 * (x - min_reward) / (max_value - min_reward) for x in dataset['rewards']]
+    rewards = np.asarray(dataset['rewards'], dtype=np.float32)
+    min_reward = rewards.min()
+    max_value = rewards.max()
+    dataset['rewards'] = 2 * (rewards - min_reward) / (max_value - min_reward) - 1
+    clear_cache(dataset)
     return dataset
 
+"""
+zero-padded prefix sums of terminals and rewards, so that the sum over [s, s+len_t) is
+cum[s+len_t] - cum[s]. computed once per dataset and cached on it, call clear_cache after
+modifying terminals or rewards.
+"""
+def get_cumsums(dataset):
+    if '_term_cum' not in dataset:
+        terminals = np.asarray(dataset['terminals'], dtype=np.int64)
+        rewards = np.asarray(dataset['rewards'], dtype=np.float64)
+        dataset['_term_cum'] = np.concatenate(([0], np.cumsum(terminals)))
+        dataset['_rew_cum'] = np.concatenate(([0.0], np.cumsum(rewards)))
+    return dataset['_term_cum'], dataset['_rew_cum']
+
+"""
+observations and actions concatenated into a single contiguous float32 array, the input
+layout of the latent reward model. computed once per dataset and cached on it.
+observations, next_observations and actions are also converted to contiguous float32 in
+place, so that no later step upcasts to float64 and all state arrays share one dtype.
+"""
+def precompute_obs_act(dataset):
+    if '_obs_act' not in dataset:
+        for k in ('observations', 'next_observations', 'actions'):
+            dataset[k] = np.ascontiguousarray(dataset[k], dtype=np.float32)
+        obs_act = np.concatenate([dataset['observations'], dataset['actions']], axis=1)
+        dataset['_obs_act'] = obs_act
+    return dataset['_obs_act']
+
 """
 num_t : number of pairs of trajectories
 len_t : length of each trajectory
 """
 def generate_pbrl_dataset(dataset, num_t, pbrl_dataset_file_path="", len_t=20):
-    if pbrl_dataset_file_path != "" and os.path.exists(pbrl_dataset_file_path):
-        pbrl_dataset = np.load(pbrl_dataset_file_path)
-        print(f"pbrl_dataset loaded successfully from {pbrl_dataset_file_path}")
-        return (pbrl_dataset['t1s'], pbrl_dataset['t2s'], pbrl_dataset['ps'])
+    pbrl_dataset = load_pbrl_dataset(pbrl_dataset_file_path)
+    if pbrl_dataset is not None:
+        return pbrl_dataset
     else:
-        t1s = np.zeros((num_t, len_t), dtype=int)
-        t2s = np.zeros((num_t, len_t), dtype=int)
-        ps = np.zeros(num_t)
-        for i in range(num_t):
-            t1, r1 = get_random_trajectory_reward(dataset, len_t)
-            t2, r2 = get_random_trajectory_reward(dataset, len_t)
-            
-            p = np.exp(r1) / (np.exp(r1) + np.exp(r2))
-            t1s[i] = t1
-            t2s[i] = t2
-            ps[i] = p
-        np.savez(pbrl_dataset_file_path, t1s=t1s, t2s=t2s, ps=ps)
-        # print(f"saving trajectories...")
+        if njit is not None:
+            N = dataset['observations'].shape[0]
+            term_cum, rew_cum = get_cumsums(dataset)
+            # one independent seed per chunk, drawn from the global numpy generator
+            n_chunks = -(-num_t // SAMPLE_CHUNK_SIZE)
+            seeds = np.random.randint(2**31, size=n_chunks)
+            t1s, t2s, ps = _sample_pairs(term_cum, rew_cum, N, len_t, num_t, seeds,
+                                         SAMPLE_CHUNK_SIZE)
+        else:
+            starts, rs = sample_random_trajectories(dataset, 2 * num_t, len_t)
+            t1s = starts[:num_t, None] + np.arange(len_t)
+            t2s = starts[num_t:, None] + np.arange(len_t)
+            r1, r2 = rs[:num_t], rs[num_t:]
+            # sigmoid(r1 - r2) == exp(r1) / (exp(r1) + exp(r2)) without the overflow
+            with np.errstate(over='ignore'):
+                ps = 1.0 / (1.0 + np.exp(r2 - r1))
+        if pbrl_dataset_file_path != "":
+            save_pbrl_dataset(pbrl_dataset_file_path, (t1s, t2s, ps))
         return (t1s, t2s, ps)
 
+"""
+pbrl datasets are stored as one .npy file per array next to pbrl_dataset_file_path
+(a trailing .npz is stripped first), and loaded memory-mapped so that arrays are only
+paged in when they are accessed. .npz files written by older versions are still loaded.
+"""
+def _pbrl_array_paths(pbrl_dataset_file_path):
+    base, ext = os.path.splitext(pbrl_dataset_file_path)
+    if ext != '.npz':
+        base = pbrl_dataset_file_path
+    return [f'{base}.{name}.npy' for name in ('t1s', 't2s', 'ps')]
+
+def save_pbrl_dataset(pbrl_dataset_file_path, pbrl_dataset):
+    for path, arr in zip(_pbrl_array_paths(pbrl_dataset_file_path), pbrl_dataset):
+        np.save(path, arr, allow_pickle=False)
+
+def load_pbrl_dataset(pbrl_dataset_file_path):
+    if pbrl_dataset_file_path == "":
+        return None
+    paths = _pbrl_array_paths(pbrl_dataset_file_path)
+    if all(os.path.exists(path) for path in paths):
+        pbrl_dataset = tuple(np.load(path, mmap_mode='r') for path in paths)
+    elif os.path.exists(pbrl_dataset_file_path):
+        npz = np.load(pbrl_dataset_file_path)
+        pbrl_dataset = (npz['t1s'], npz['t2s'], npz['ps'])
+    else:
+        return None
+    print(f"pbrl_dataset loaded successfully from {pbrl_dataset_file_path}")
+    return pbrl_dataset
+
+"""
+draws n trajectories of length len_t that contain no terminal state.
+returns their start indices and reward sums.
+"""
+def sample_random_trajectories(dataset, n, len_t, oversample=2):
+    N = dataset['observations'].shape[0]
+    term_cum, rew_cum = get_cumsums(dataset)
+    starts = np.empty(0, dtype=int)
+    while starts.shape[0] < n:
+        candidates = np.random.randint(0, N-len_t, size=n * oversample)
+        valid = term_cum[candidates + len_t] - term_cum[candidates] == 0
+        starts = np.concatenate((starts, candidates[valid]))
+    starts = starts[:n]
+    rs = rew_cum[starts + len_t] - rew_cum[starts]
+    return starts, rs
+
+if njit is not None:
+    @njit(cache=True)
+    def _sample_start(term_cum, N, len_t):
+        start = np.random.randint(0, N-len_t)
+        while term_cum[start+len_t] - term_cum[start] > 0:
+            start = np.random.randint(0, N-len_t)
+        return start
+
+    """
+    same sampling as sample_random_trajectories, compiled and parallel over chunks of
+    chunk_size pairs. each chunk seeds the generator of its thread with seeds[chunk], so
+    the output does not depend on thread scheduling.
+    """
+    @njit(parallel=True, cache=True)
+    def _sample_pairs(term_cum, rew_cum, N, len_t, num_t, seeds, chunk_size):
+        t1s = np.empty((num_t, len_t), dtype=np.int64)
+        t2s = np.empty((num_t, len_t), dtype=np.int64)
+        ps = np.empty(num_t)
+        for chunk in prange(seeds.shape[0]):
+            np.random.seed(seeds[chunk])
+            for i in range(chunk * chunk_size, min((chunk + 1) * chunk_size, num_t)):
+                s1 = _sample_start(term_cum, N, len_t)
+                s2 = _sample_start(term_cum, N, len_t)
+                r1 = rew_cum[s1+len_t] - rew_cum[s1]
+                r2 = rew_cum[s2+len_t] - rew_cum[s2]
+                ps[i] = 1.0 / (1.0 + np.exp(r2 - r1))
+                for j in range(len_t):
+                    t1s[i, j] = s1 + j
+                    t2s[i, j] = s2 + j
+        return t1s, t2s, ps
+
 def get_random_trajectory_reward(dataset, len_t):
     N = dataset['observations'].shape[0]
+    term_cum, rew_cum = get_cumsums(dataset)
     start = np.random.randint(0, N-len_t)
-    while np.any(dataset['terminals'][start:start+len_t], axis=0):
+    while term_cum[start+len_t] - term_cum[start] > 0:
         start = np.random.randint(0, N-len_t)
-    traj = np.array(np.arange(start, start+len_t))
-    reward = np.sum(dataset['rewards'][start:start+len_t])
+    traj = np.arange(start, start+len_t)
+    reward = rew_cum[start+len_t] - rew_cum[start]
     return traj, reward
 
-def label_by_trajectory_reward(dataset, pbrl_dataset, num_t, len_t=20):
+"""
+generator : torch.Generator for the index sampling, pass a seeded one for reproducible
+            runs. defaults to torch's global generator.
+"""
+def label_by_trajectory_reward(dataset, pbrl_dataset, num_t, len_t=20, generator=None):
     # double checking
     t1s, t2s, ps = pbrl_dataset
-    sampled = np.random.randint(low=0, high=num_t, size=(num_t,))
+    # new_rewards below is sized from len_t, so a mismatch would silently misalign fields
+    assert t1s.shape[1] == len_t and t2s.shape[1] == len_t, \
+        f'pbrl_dataset has trajectories of length {t1s.shape[1]}, got len_t={len_t}'
+    sampled = torch.randint(num_t, (num_t,), generator=generator).numpy()
     t1s_indices = t1s[sampled].flatten()
     t2s_indices = t2s[sampled].flatten()
     # t1s_indices = t1s.flatten()
     # t2s_indices = t2s.flatten()
     ps_sample = ps[sampled]
     mus = bernoulli_trial_one_neg_one(ps_sample)
-    repeated_mus = np.repeat(mus, len_t)
-    
-    sampled_dataset = dataset.copy()
-    sampled_dataset['rewards'] = np.array(sampled_dataset['rewards'])
-    sampled_dataset['rewards'][t1s_indices] = repeated_mus
-    sampled_dataset['rewards'][t2s_indices] = -1 * repeated_mus
-
     all_indices = np.concatenate([t1s_indices, t2s_indices])
-    sampled_dataset['observations'] = sampled_dataset['observations'][all_indices]
-    sampled_dataset['actions'] = sampled_dataset['actions'][all_indices]
-    sampled_dataset['next_observations'] = sampled_dataset['next_observations'][all_indices]
-    sampled_dataset['rewards'] = sampled_dataset['rewards'][all_indices]
-    sampled_dataset['terminals'] = sampled_dataset['terminals'][all_indices]
+
+    # only the sampled rows are kept, so the labels are written straight into them,
+    # broadcasting each pair's label over its len_t steps
+    new_rewards = np.empty(2 * num_t * len_t, dtype=np.float32)
+    new_rewards_view = new_rewards.reshape(2, num_t, len_t)
+    new_rewards_view[0] = mus[:, None]
+    new_rewards_view[1] = -1 * mus[:, None]
+
+    keys = ('observations', 'actions', 'next_observations', 'terminals')
+    sampled_dataset = {k: dataset[k][all_indices] for k in keys}
+    sampled_dataset['rewards'] = new_rewards
 
     return sampled_dataset
 
 def bernoulli_trial_one_neg_one(p):
-    mus = torch.bernoulli(torch.from_numpy(p)).numpy()
-    return -1 + 2 * mus
+    mus = (np.random.random(p.shape) < p).astype(np.float32)
+    return 2 * mus - 1
 
 def mlp(sizes, activation, output_activation=nn.Identity):
     layers = []
@@ -87,42 +219,48 @@ def mlp(sizes, activation, output_activation=nn.Identity):
 class LatentRewardModel(nn.Module):
     def __init__(self, input_dim, hidden_dim = 64, output_dim = 1, activation = nn.ReLU):
         super().__init__()
-        self.multi_layer = mlp([input_dim, hidden_dim, hidden_dim, hidden_dim, 1], activation=activation)
-        self.one_layer = nn.Linear(input_dim, output_dim)
+        sizes = [input_dim, hidden_dim, hidden_dim, hidden_dim, output_dim]
+        self.multi_layer = mlp(sizes, activation=activation)
         self.tanh = nn.Tanh()
 
     def forward(self, x):
-        x = self.multi_layer(x)
-        x = self.tanh(x)
-        # x = self.one_layer(x)
-        return x
+        return self.tanh(self.multi_layer(x))
     
 """
 pbrl_dataset          : tuple of  (t1s, t2s, p)
 latent_reward_X : (2 * N * num_t * len_t , 23)
 mus : (2 * N * num_t * len_t, 1)
+generator : torch.Generator for the index sampling, defaults to torch's global generator
 """
-def make_latent_reward_dataset(dataset, pbrl_dataset, num_t, len_t=20):
+def make_latent_reward_dataset(dataset, pbrl_dataset, num_t, len_t=20, generator=None):
     t1s, t2s, ps = pbrl_dataset
-    indices = torch.randint(high=num_t, size=(num_t,))
+    indices = torch.randint(num_t, (num_t,), generator=generator).numpy()
     t1s_sample = t1s[indices]
     t2s_sample = t2s[indices]
     ps_sample = ps[indices]
-    obss = dataset['observations']
-    acts = dataset['actions']
-    indices = np.concatenate((t1s_sample, t2s_sample), axis = 1)
-    indices = np.concatenate(indices)
-    obs_values = obss[indices] 
-    act_values = acts[indices]
-    latent_reward_X = np.concatenate((obs_values, act_values), axis=1)
+    # pair-major layout (num_t, 2, len_t), as expected by the .view() in train_latent
+    indices = np.empty((num_t, 2, len_t), dtype=np.int64)
+    indices[:, 0] = t1s_sample
+    indices[:, 1] = t2s_sample
+    indices = indices.reshape(-1)
+    latent_reward_X = torch.from_numpy(precompute_obs_act(dataset)[indices])
     
-    mus = torch.bernoulli(torch.from_numpy(ps_sample)).long()
-    return torch.tensor(latent_reward_X), mus, indices
+    mus = (np.random.random(ps_sample.shape) < ps_sample).astype(np.int64)
+    mus = torch.from_numpy(mus)
+    return latent_reward_X, mus, indices
 
 
 def train_latent(dataset, pbrl_dataset, num_t, len_t,
-                 n_epochs = 1000, patience=5, model_file_path=""):
-    X, mus, indices = make_latent_reward_dataset(dataset, pbrl_dataset, num_t=num_t, len_t=len_t)
+                 n_epochs = 1000, patience=5, model_file_path="",
+                 batch_size=4096, num_workers=4, device=None, generator=None):
+    if device is None:
+        device = 'cuda' if torch.cuda.is_available() else 'cpu'
+    device_type = torch.device(device).type
+    # BF16 only pays off on CUDA tensor cores, and torch raises on GPUs without BF16
+    # support (older than sm_80), so everything else stays in FP32
+    use_bf16 = device_type == 'cuda' and torch.cuda.is_bf16_supported()
+    X, mus, indices = make_latent_reward_dataset(dataset, pbrl_dataset, num_t=num_t,
+                                                 len_t=len_t, generator=generator)
     dim = dataset['observations'].shape[1] + dataset['actions'].shape[1]
     # if os.path.exists(model_file_path):
     #     print(f'model successfully loaded from {model_file_path}')
@@ -131,26 +269,65 @@ def train_latent(dataset, pbrl_dataset, num_t, len_t,
     #         return model, indices
     
     assert((num_t * 2 * len_t, dim) == X.shape)
-    model = LatentRewardModel(input_dim=dim)
-    criterion = nn.CrossEntropyLoss()
+    # one item per pair, so that mini-batches never split a pair of trajectories.
+    # the sampler yields whole batches of pair indices, which TensorDataset gathers
+    # in a single indexing op
+    pairs = torch.utils.data.TensorDataset(X.view(num_t, 2, len_t, dim), mus)
+    sampler = torch.utils.data.BatchSampler(
+        torch.utils.data.RandomSampler(pairs, generator=generator), batch_size,
+        drop_last=False)
+    loader_kwargs = {}
+    if num_workers > 0:
+        # prefetching more than two batches per worker only costs memory
+        loader_kwargs = {'persistent_workers': True, 'prefetch_factor': 2}
+    loader = torch.utils.data.DataLoader(pairs, batch_size=None, sampler=sampler,
+                                         num_workers=num_workers,
+                                         pin_memory=device_type == 'cuda',
+                                         **loader_kwargs)
+    model = LatentRewardModel(input_dim=dim).to(device)
+    # the compiled wrapper is only used for the forward pass, checkpoints are taken
+    # from model. batches have a fixed shape apart from the last one, so at most two
+    # graphs are compiled
+    if hasattr(torch, 'compile'):
+        forward_model = torch.compile(model, mode='reduce-overhead', fullgraph=True)
+    else:
+        forward_model = model
     optimizer = optim.Adam(model.parameters(), lr=0.001)
     best_loss = float('inf')
     current_patience = 0
 
+    # fixed evaluation pairs for evaluate_latent_model, built once instead of at every
+    # evaluation. they are drawn from the same dataset and may overlap the training pairs
+    num_t_eval = 10000
+    eval_pbrl_dataset = generate_pbrl_dataset(dataset, num_t=num_t_eval, len_t=len_t)
+    X_eval, mu_eval, _ = make_latent_reward_dataset(dataset, eval_pbrl_dataset,
+                                                    num_t_eval, len_t=len_t,
+                                                    generator=generator)
+    X_eval = X_eval.to(device)
+    mu_eval = mu_eval.to(device)
+
     print('training...')
     for epoch in range(n_epochs):
-        total_loss = 0.0
-        latent_rewards = model(X).view(num_t, 2, len_t, -1)
-        latent_r_sum = torch.sum(latent_rewards, dim=2)
-        p = torch.nn.functional.softmax(latent_r_sum, dim=1)
-        loss = criterion(p.view(-1, 2), mus)
-        optimizer.zero_grad()
-        loss.backward()
-        optimizer.step()
-        total_loss = torch.sum(loss)
+        total_loss = torch.zeros((), device=device)
+        for xb, yb in loader:
+            xb = xb.to(device, non_blocking=True)
+            yb = yb.to(device, non_blocking=True)
+            bs = xb.shape[0]
+            with torch.autocast(device_type=device_type, dtype=torch.bfloat16,
+                                enabled=use_bf16):
+                latent_rewards = forward_model(xb.view(-1, dim)).view(bs, 2, len_t)
+                latent_r_sum = torch.sum(latent_rewards, dim=2)
+                # P(t1 preferred) = sigmoid(r1 - r2), mus ~ Bernoulli(P(t1 preferred))
+                logits = latent_r_sum[:,0] - latent_r_sum[:,1]
+                loss = F.binary_cross_entropy_with_logits(logits.float(), yb.float())
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            total_loss += loss.detach() * bs / num_t
         if (epoch+1) % 50 == 0:
+            total_loss = total_loss.item()
             print(f'Epoch {epoch + 1}/{n_epochs}, Total Loss: {total_loss}')
-            evaluate_latent_model(model, dataset)
+            evaluate_latent_model(model, X_eval, mu_eval, num_t=num_t_eval, len_t=len_t)
             if total_loss < best_loss:
                 best_loss = total_loss
                 current_patience = 0
@@ -167,44 +344,50 @@ def train_latent(dataset, pbrl_dataset, num_t, len_t,
                 break
     return model, indices
 
-def evaluate_latent_model(model, dataset, num_t=10000, len_t = 20):
-    with torch.no_grad():
-        t1s, t2s, ps = generate_pbrl_dataset(dataset, num_t=num_t)
-        X_eval, mu_eval, _ = make_latent_reward_dataset(dataset, (t1s, t2s, ps), num_t)
-        latent_rewards = model(X_eval).view(num_t, 2, len_t, -1)
+"""
+X_eval, mu_eval : output of make_latent_reward_dataset, on the device of model
+"""
+def evaluate_latent_model(model, X_eval, mu_eval, num_t=10000, len_t = 20):
+    with torch.inference_mode():
+        latent_rewards = model(X_eval).view(num_t, 2, len_t)
         latent_r_sum = torch.sum(latent_rewards, dim=2)
-        latent_p = torch.nn.functional.softmax(latent_r_sum, dim=1)[:,1]
-        latent_mus = torch.bernoulli(latent_p).long()
+        # predict the more likely label (t1 preferred iff r1 > r2) instead of sampling
+        latent_mus = (latent_r_sum[:,0] > latent_r_sum[:,1]).long()
 
         mus_test_flat = mu_eval.view(-1)
         latent_mus_flat = latent_mus.view(-1)
         assert(mus_test_flat.shape == latent_mus_flat.shape)
-        accuracy = accuracy_score(mus_test_flat.cpu().numpy(), latent_mus_flat.cpu().numpy())
+        accuracy = (latent_mus_flat == mus_test_flat).float().mean().item()
         print(f'Accuracy: {accuracy:.4f}')
 
-def predict_and_label_latent_reward(dataset, latent_reward_model, indices):
-    with torch.no_grad():
+def predict_and_label_latent_reward(dataset, latent_reward_model, indices,
+                                    chunk_size=65536):
+    with torch.inference_mode():
         print('predicting and labeling with reward model...')
-        obss = dataset['observations']
-        acts = dataset['actions']
-        obs_values = obss[indices] 
-        act_values = acts[indices]
-        latent_reward_X = np.concatenate((obs_values, act_values), axis=1)
-        latent_rewards = latent_reward_model(torch.tensor(latent_reward_X))
-        sampled_dataset = dataset.copy()
-        sampled_dataset['rewards'] = latent_rewards
+        latent_reward_X = torch.from_numpy(precompute_obs_act(dataset)[indices])
+        device = next(latent_reward_model.parameters()).device
+        n = latent_reward_X.shape[0]
+        # chunked forward passes bound the size of the intermediate activations
+        latent_rewards = torch.empty(n, dtype=torch.float32)
+        for i in range(0, n, chunk_size):
+            chunk = latent_reward_X[i:i+chunk_size].to(device)
+            latent_rewards[i:i+chunk_size] = latent_reward_model(chunk).view(-1).cpu()
+        sampled_dataset = clear_cache(dataset.copy())
 
         sampled_dataset['observations'] = sampled_dataset['observations'][indices]
         sampled_dataset['actions'] = sampled_dataset['actions'][indices]
         sampled_dataset['next_observations'] = sampled_dataset['next_observations'][indices]
-        sampled_dataset['rewards'] = latent_rewards.view(-1).numpy()
+        sampled_dataset['rewards'] = latent_rewards.numpy()
         sampled_dataset['terminals'] = sampled_dataset['terminals'][indices]
         return sampled_dataset
 
 def load_model(model_file_path, dim):
     model = LatentRewardModel(input_dim=dim)
     checkpoint = torch.load(model_file_path)
-    model.load_state_dict(checkpoint['model_state_dict'])
+    # checkpoints from before the unused one_layer was removed still carry its weights
+    state_dict = {k: v for k, v in checkpoint['model_state_dict'].items()
+                  if not k.startswith('one_layer.')}
+    model.load_state_dict(state_dict)
     epoch = checkpoint['epoch']
     return model, epoch
 
@@ -220,10 +403,9 @@ def plot_reward(dataset):
     print("Number of terminal states:", np.sum(dataset['terminals']))
 
 def generate_pbrl_dataset_no_overlap(dataset, num_t, len_t, pbrl_dataset_file_path=""):
-    if pbrl_dataset_file_path != "" and os.path.exists(pbrl_dataset_file_path):
-        pbrl_dataset = np.load(pbrl_dataset_file_path)
-        print(f"pbrl_dataset loaded successfully from {pbrl_dataset_file_path}")
-        return (pbrl_dataset['t1s'], pbrl_dataset['t2s'], pbrl_dataset['ps'])
+    pbrl_dataset = load_pbrl_dataset(pbrl_dataset_file_path)
+    if pbrl_dataset is not None:
+        return pbrl_dataset
     else:
         # assuming no terminal states
         t1s = np.zeros((num_t, len_t), dtype=int)
@@ -238,7 +420,8 @@ def generate_pbrl_dataset_no_overlap(dataset, num_t, len_t, pbrl_dataset_file_pa
             t1s[i] = t1
             t2s[i] = t2
             ps[i] = p
-        np.savez(pbrl_dataset_file_path, t1s=t1s, t2s=t2s, ps=ps)
+        if pbrl_dataset_file_path != "":
+            save_pbrl_dataset(pbrl_dataset_file_path, (t1s, t2s, ps))
         return (t1s, t2s, ps)
     
 def pick_and_calc_reward(dataset, starting_indices, len_t):